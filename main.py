@@ -1,18 +1,24 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 import aiohttp
+import heapq
+import orjson
+import redis.asyncio as aioredis
+from dataclasses import dataclass, field
 import os
+import re
 import uuid
-import json
 import random
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
 import threading
 import time
 from typing import Dict, List
@@ -21,7 +27,7 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Pick N Brain Backend")
+app = FastAPI(title="Pick N Brain Backend", default_response_class=ORJSONResponse)
 
 # Mount static files (if needed for future assets)
 app.mount("/static", StaticFiles(directory="."), name="static")
@@ -41,13 +47,121 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 
+# Bound on concurrent outbound Gemini calls: when saturated, requests queue on
+# the semaphore instead of piling up sockets until the connector times out
+_gemini_sem: asyncio.Semaphore
+
+# Shared HTTP client for outbound Gemini calls (connection pooling + keep-alive,
+# so repeated requests reuse a warm TLS connection instead of handshaking each time)
+@app.on_event("startup")
+async def create_http_client():
+    global _gemini_sem
+    _gemini_sem = asyncio.Semaphore(64)
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=128,
+            limit_per_host=128,
+            ttl_dns_cache=300,
+            keepalive_timeout=75
+        ),
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
+
+@app.on_event("startup")
+async def create_redis_client():
+    global _redis, _token_bucket
+    if REDIS_URL:
+        _redis = aioredis.from_url(REDIS_URL, decode_responses=False)
+        _token_bucket = _redis.register_script(TOKEN_BUCKET_LUA)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await app.state.http.close()
+    if _redis is not None:
+        await _redis.aclose()
+
 # Get API key from environment
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 
-# Question categories for variety
-QUESTION_CATEGORIES = [
+# Optional Redis session backend. With REDIS_URL set, sessions, per-IP
+# tracking and rate-limit buckets live in Redis (with native TTL expiry),
+# so uvicorn can run multiple workers that share one store. Without it,
+# the in-memory sharded store below is used and we stay single-worker
+REDIS_URL = os.getenv('REDIS_URL')
+_redis = None
+_token_bucket = None
+
+# Atomic token bucket: refill from Redis server time, take one token,
+# return whether the request is allowed — one round-trip per check
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local tokens = capacity
+local last = now
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+if state[1] then
+    tokens = tonumber(state[1])
+    last = tonumber(state[2])
+end
+tokens = math.min(capacity, tokens + (now - last) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return allowed
+"""
+
+# Gemini URLs and the static parts of the request payloads, built once at
+# module load instead of on every call (everything here is read-only; the
+# variable parts are assembled per request around these)
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+
+# Cached so swapping or A/B-testing models later gets a prebuilt URL
+# instead of re-interpolating the key on every call
+@lru_cache(maxsize=8)
+def _gemini_url(model: str, action: str = "generateContent") -> str:
+    return f"{GEMINI_BASE_URL}/{model}:{action}?key={GEMINI_API_KEY}"
+
+GENERATE_URL = _gemini_url("imagen-3.0-generate-002", "predict")
+ANALYZE_URL = _gemini_url("gemini-2.5-flash-preview-05-20")
+VALIDATE_URL = ANALYZE_URL
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+GENERATE_PARAMETERS = {"sampleCount": 1}
+
+ANALYZE_GENCONFIG = {
+    "responseMimeType": "application/json",
+    "responseSchema": {
+        "type": "OBJECT",
+        "properties": {
+            "challenge": {"type": "STRING"},
+            "solution": {"type": "STRING"}
+        },
+        "required": ["challenge", "solution"]
+    }
+}
+
+# Marker spliced out of the serialized analyze payload so the client's base64
+# image bytes are inserted verbatim, never re-encoded through a Python str.
+# Safe because validated base64 cannot contain underscores (or quotes)
+SCENE_DATA_PLACEHOLDER = "__SCENE_DATA__"
+SCENE_DATA_MARKER = b'"__SCENE_DATA__"'
+BASE64_RE = re.compile(r'^[A-Za-z0-9+/]+={0,2}$')
+
+VALIDATE_SYSTEM_INSTRUCTION = {
+    "parts": [{"text": "Eres un evaluador de respuestas para un juego. Tu única función es determinar si la respuesta de un usuario es correcta. Debes responder ÚNICAMENTE con la palabra 'si' o 'no', en minúsculas y sin ningún otro texto o puntuación."}]
+}
+
+# Question categories for variety (tuple: immutable, slightly faster indexing)
+QUESTION_CATEGORIES = (
     "colores (de ropa, cabello, objetos, fondo)",
     "posiciones (dónde están parados/sentados los personajes)",
     "acciones (qué están haciendo los personajes)",
@@ -58,105 +172,175 @@ QUESTION_CATEGORIES = [
     "tamaños (comparaciones: más grande/pequeño)",
     "formas (formas de objetos o elementos)",
     "relaciones (quién está al lado de quién, interacciones)"
-]
-
-# Session storage
-sessions: Dict[str, Dict] = {}
-ip_sessions: Dict[str, List[str]] = {}
+)
 
-# Cleanup expired sessions every 5 minutes
-def cleanup_sessions():
+# Dedicated RNG instance so category picks skip the module-global
+# Mersenne Twister shared (and locked) across threads
+_rng = random.Random()
+
+# Slotted so each session costs a fixed set of slots instead of a ~300-byte
+# dict, and the hot-path reads are C-level slot lookups. expires_at/buckets
+# are only meaningful for the in-memory store; Redis handles both itself
+@dataclass(slots=True)
+class Session:
+    token: str
+    ip: str
+    expires_at: float = 0.0
+    buckets: Dict[str, List[float]] = field(default_factory=dict)
+
+# Session storage, sharded so concurrent requests and the cleanup thread
+# contend on 1/SHARDS-sized dicts instead of serializing on one structure
+SHARDS = 16
+
+session_shards: List[Dict[str, Session]] = [{} for _ in range(SHARDS)]
+session_locks: List[threading.Lock] = [threading.Lock() for _ in range(SHARDS)]
+ip_shards: List[Dict[str, List[str]]] = [{} for _ in range(SHARDS)]
+ip_locks: List[threading.Lock] = [threading.Lock() for _ in range(SHARDS)]
+
+def _session_shard(token: str):
+    index = hash(token) & (SHARDS - 1)
+    return session_shards[index], session_locks[index]
+
+def _ip_shard(ip: str):
+    index = hash(ip) & (SHARDS - 1)
+    return ip_shards[index], ip_locks[index]
+
+def _remove_ip_session(ip: str, token: str):
+    ip_shard, ip_lock = _ip_shard(ip)
+    with ip_lock:
+        ip_list = ip_shard.get(ip, [])
+        if token in ip_list:
+            ip_list.remove(token)
+            if not ip_list:
+                del ip_shard[ip]
+
+# Min-heap of (expires_at, token) so cleanup only touches sessions whose
+# deadline actually passed, instead of scanning every shard on a timer
+expiry_heap: List[tuple] = []
+expiry_lock = threading.Lock()
+
+async def _evict_expired(now):
+    popped = 0
     while True:
-        time.sleep(300)  # 5 minutes
-        now = datetime.now()
-        expired_tokens = []
-        for token, session in sessions.items():
-            if now > session['expires_at']:
-                expired_tokens.append(token)
-                # Remove from IP tracking
-                ip_list = ip_sessions.get(session['ip'], [])
-                if token in ip_list:
-                    ip_list.remove(token)
-                    if not ip_list:
-                        del ip_sessions[session['ip']]
-
-        for token in expired_tokens:
-            del sessions[token]
-
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=cleanup_sessions, daemon=True)
-cleanup_thread.start()
-
-# Pydantic models
-class StartSessionResponse(BaseModel):
-    sessionToken: str
-    expiresAt: str
-
+        with expiry_lock:
+            if not expiry_heap or expiry_heap[0][0] > now:
+                return
+            _, token = heapq.heappop(expiry_heap)
+
+        shard, lock = _session_shard(token)
+        with lock:
+            session = shard.get(token)
+            # Heap entries can go stale if the session was already removed
+            # (e.g. lazily in get_session) — verify before deleting
+            if session and now > session.expires_at:
+                del shard[token]
+                expired_ip = session.ip
+            else:
+                expired_ip = None
+
+        if expired_ip is not None:
+            _remove_ip_session(expired_ip, token)
+
+        # Yield periodically so a large backlog doesn't block the event loop
+        popped += 1
+        if popped % 256 == 0:
+            await asyncio.sleep(0)
+
+# Expiry is enforced lazily in get_session; this GC only reclaims memory for
+# sessions that expired without being touched again, and runs on demand once
+# the store doubles past a watermark instead of on a dedicated thread
+GC_MIN_SESSIONS = 1000
+_last_gc_size = 0
+_gc_task = None
+
+def _total_sessions() -> int:
+    return sum(len(shard) for shard in session_shards)
+
+async def _gc_expired_sessions():
+    global _last_gc_size
+    await _evict_expired(time.monotonic())
+    _last_gc_size = _total_sessions()
+
+def _maybe_schedule_gc():
+    global _gc_task
+    if _gc_task is not None and not _gc_task.done():
+        return
+    total = _total_sessions()
+    if total > GC_MIN_SESSIONS and total > 2 * _last_gc_size:
+        _gc_task = asyncio.create_task(_gc_expired_sessions())
+
+# Pydantic models (requests only — responses are returned as ORJSONResponse
+# directly, skipping a Pydantic model construction + validation per response)
 class GenerateSceneRequest(BaseModel):
     scenePrompt: str
 
-class GenerateSceneResponse(BaseModel):
-    sceneImage: str
-
-class AnalyzeSceneRequest(BaseModel):
-    sceneData: str
-
-class AnalyzeSceneResponse(BaseModel):
-    challenge: str
-    solution: str
-
 class ValidateChallengeRequest(BaseModel):
     challenge: str
     solution: str
     playerResponse: str
 
-class ValidateChallengeResponse(BaseModel):
-    correct: bool
+# Dependency to get and validate session; memoized on request.state so any
+# dependency resolving it later in the same request reuses the lookup
+async def get_session(request: Request) -> Session:
+    cached = getattr(request.state, 'session', None)
+    if cached is not None:
+        return cached
 
-# Dependency to get and validate session
-async def get_session(request: Request) -> Dict:
-    auth_header = request.headers.get('authorization', '')
-    if not auth_header.startswith('Bearer '):
+    auth = request.headers.get('authorization')
+    if not auth or len(auth) < 8 or auth[:7] != 'Bearer ':
         raise HTTPException(status_code=401, detail="Missing session token")
 
-    token = auth_header[7:]
-    session = sessions.get(token)
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid session token")
-
-    if datetime.now() > session['expires_at']:
-        del sessions[token]
-        raise HTTPException(status_code=401, detail="Session expired")
-
-    return session
-
-# Rate limit check function
-def check_rate_limit(session: Dict, endpoint: str, requests_per_hour: int):
-    now = datetime.now()
-    window_start = now - timedelta(hours=1)
-
-    # Reset counts if window passed
-    if session.get('window_start', datetime.min) < window_start:
-        session['window_start'] = now
-        session['request_counts'] = {'generate_scene': 0, 'analyze_scene': 0, 'validate_challenge': 0}
-
-    count_key = f"{endpoint}_count"
-    if session['request_counts'].get(count_key, 0) >= requests_per_hour:
+    token = auth[7:]
+
+    if _redis is not None:
+        raw = await _redis.get(f"s:{token}")
+        if raw is None:
+            # Expired keys vanish via Redis TTL, so missing == invalid or expired
+            raise HTTPException(status_code=401, detail="Invalid session token")
+        data = orjson.loads(raw)
+        session = Session(token=data['token'], ip=data['ip'])
+        request.state.session = session
+        return session
+
+    shard, lock = _session_shard(token)
+    with lock:
+        session = shard.get(token)
+        if not session:
+            raise HTTPException(status_code=401, detail="Invalid session token")
+
+        if time.monotonic() > session.expires_at:
+            del shard[token]
+            expired_ip = session.ip
+        else:
+            request.state.session = session
+            return session
+
+    _remove_ip_session(expired_ip, token)
+    raise HTTPException(status_code=401, detail="Session expired")
+
+# Rate limit check function: token bucket per (session, endpoint). Unlike the
+# old fixed 1-hour window, this cannot be burst at 2x around a window reset —
+# tokens refill continuously at requests_per_hour/3600 per second
+async def check_rate_limit(session: Session, endpoint: str, requests_per_hour: int):
+    if _redis is not None:
+        allowed = await _token_bucket(
+            keys=[f"rl:{session.token}:{endpoint}"],
+            args=[requests_per_hour, requests_per_hour / 3600.0, 3600]
+        )
+        if not allowed:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded for this session")
+        return
+
+    # Buckets are preallocated per endpoint in start_session; update in place
+    # so no per-request key formatting or list allocation happens here
+    bucket = session.buckets[endpoint]
+    now = time.monotonic()
+    tokens = min(float(requests_per_hour), bucket[0] + (now - bucket[1]) * (requests_per_hour / 3600.0))
+    if tokens < 1:
         raise HTTPException(status_code=429, detail="Rate limit exceeded for this session")
 
-    session['request_counts'][count_key] = session['request_counts'].get(count_key, 0) + 1
-
-# Middleware to check max sessions per IP
-@app.middleware("http")
-async def check_max_sessions(request: Request, call_next):
-    if request.url.path == "/api/game/start-session":
-        client_ip = request.client.host
-        active_sessions = ip_sessions.get(client_ip, [])
-        if len(active_sessions) >= 3:
-            raise HTTPException(status_code=429, detail="Maximum sessions per IP reached")
-
-    response = await call_next(request)
-    return response
+    bucket[0] = tokens - 1
+    bucket[1] = now
 
 # Serve index.html at root
 @app.get("/")
@@ -164,135 +348,173 @@ async def serve_index():
     return FileResponse("index.html", media_type="text/html")
 
 # Routes
-@app.post("/api/game/start-session", response_model=StartSessionResponse)
+@app.post("/api/game/start-session")
 async def start_session(request: Request):
     client_ip = request.client.host
-    session_token = str(uuid.uuid4())
-    expires_at = datetime.now() + timedelta(hours=1)
-
-    session = {
-        'token': session_token,
-        'ip': client_ip,
-        'created_at': datetime.now(),
-        'expires_at': expires_at,
-        'request_counts': {'generate_scene': 0, 'analyze_scene': 0, 'validate_challenge': 0},
-        'window_start': datetime.now()
-    }
+    session_token = uuid.uuid4().hex
+    expires_at_iso = (datetime.now() + timedelta(hours=1)).isoformat()
 
-    sessions[session_token] = session
+    if _redis is not None:
+        ip_key = f"ip:{client_ip}"
+        if await _redis.scard(ip_key) >= 3:
+            raise HTTPException(status_code=429, detail="Maximum sessions per IP reached")
 
-    # Track sessions per IP
-    if client_ip not in ip_sessions:
-        ip_sessions[client_ip] = []
-    ip_sessions[client_ip].append(session_token)
+        # Redis expires both keys natively; rate buckets are created lazily
+        # by the Lua script on first use
+        session = {'token': session_token, 'ip': client_ip}
+        async with _redis.pipeline(transaction=False) as pipe:
+            pipe.set(f"s:{session_token}", orjson.dumps(session), ex=3600)
+            pipe.sadd(ip_key, session_token)
+            pipe.expire(ip_key, 3600)
+            await pipe.execute()
+
+        return ORJSONResponse({"sessionToken": session_token, "expiresAt": expires_at_iso})
+
+    # Max sessions per IP, checked here rather than in middleware so the
+    # other endpoints don't pay for it
+    ip_shard, ip_lock = _ip_shard(client_ip)
+    with ip_lock:
+        if len(ip_shard.get(client_ip, ())) >= 3:
+            raise HTTPException(status_code=429, detail="Maximum sessions per IP reached")
 
-    return StartSessionResponse(
-        sessionToken=session_token,
-        expiresAt=expires_at.isoformat()
+    _maybe_schedule_gc()
+
+    # Expiry is tracked as a monotonic float (cheap C-level comparison on every
+    # get_session call); the wall-clock ISO string exists only for the response
+    now_monotonic = time.monotonic()
+    expires_at = now_monotonic + 3600
+
+    bucket_start = now_monotonic
+    session = Session(
+        token=session_token,
+        ip=client_ip,
+        expires_at=expires_at,
+        buckets={
+            'generate_scene': [50.0, bucket_start],
+            'analyze_scene': [50.0, bucket_start],
+            'validate_challenge': [50.0, bucket_start]
+        }
     )
 
-@app.post("/api/game/generate-scene", response_model=GenerateSceneResponse)
-async def generate_scene(request: GenerateSceneRequest, session: Dict = Depends(get_session)):
-    check_rate_limit(session, 'generate_scene', 50)
+    shard, lock = _session_shard(session_token)
+    with lock:
+        shard[session_token] = session
+
+    with expiry_lock:
+        heapq.heappush(expiry_heap, (expires_at, session_token))
+
+    # Track sessions per IP
+    with ip_lock:
+        ip_shard.setdefault(client_ip, []).append(session_token)
+
+    return ORJSONResponse({"sessionToken": session_token, "expiresAt": expires_at_iso})
+
+@app.post("/api/game/generate-scene")
+async def generate_scene(body: GenerateSceneRequest, request: Request, session: Session = Depends(get_session)):
+    await check_rate_limit(session, 'generate_scene', 50)
 
-    if not request.scenePrompt or len(request.scenePrompt) > 200:
+    if not body.scenePrompt or len(body.scenePrompt) > 200:
         raise HTTPException(status_code=400, detail="Invalid scene prompt")
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/imagen-3.0-generate-002:predict?key={GEMINI_API_KEY}"
     payload = {
-        "instances": [{"prompt": request.scenePrompt}],
-        "parameters": {"sampleCount": 1}
+        "instances": [{"prompt": body.scenePrompt}],
+        "parameters": GENERATE_PARAMETERS
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as response:
-            if not response.ok:
+    async with _gemini_sem:
+        async with request.app.state.http.post(GENERATE_URL, data=orjson.dumps(payload), headers=JSON_HEADERS) as response:
+            if response.status != 200:
                 raise HTTPException(status_code=500, detail="Failed to generate scene")
 
-            result = await response.json()
+            result = orjson.loads(await response.read())
 
     if result.get('predictions') and result['predictions'][0].get('bytesBase64Encoded'):
-        return GenerateSceneResponse(sceneImage=result['predictions'][0]['bytesBase64Encoded'])
+        return ORJSONResponse({"sceneImage": result['predictions'][0]['bytesBase64Encoded']})
     else:
         raise HTTPException(status_code=500, detail="No image generated")
 
-@app.post("/api/game/analyze-scene", response_model=AnalyzeSceneResponse)
-async def analyze_scene(request: AnalyzeSceneRequest, session: Dict = Depends(get_session)):
-    check_rate_limit(session, 'analyze_scene', 50)
+@app.post("/api/game/analyze-scene")
+async def analyze_scene(request: Request, session: Session = Depends(get_session)):
+    await check_rate_limit(session, 'analyze_scene', 50)
+
+    # Reject oversized uploads from the header alone, before the body is
+    # ever read into memory or parsed
+    if int(request.headers.get("content-length", 0)) > 8_000_000:
+        raise HTTPException(status_code=413, detail="Scene data too large")
+
+    try:
+        data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid scene data")
 
-    if not request.sceneData:
+    scene_data = data.get('sceneData') if isinstance(data, dict) else None
+    if not scene_data or not isinstance(scene_data, str) or not BASE64_RE.match(scene_data):
         raise HTTPException(status_code=400, detail="Invalid scene data")
 
     # Randomly select a question category
-    selected_category = random.choice(QUESTION_CATEGORIES)
+    selected_category = _rng.choice(QUESTION_CATEGORIES)
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={GEMINI_API_KEY}"
     prompt = f"Observa esta imagen. Genera un objeto JSON con el siguiente esquema. La 'challenge' debe ser una pregunta simple sobre {selected_category} en la imagen. La 'solution' debe ser la respuesta corta y directa a esa pregunta. El texto debe estar en español."
 
-    payload = {
+    # Serialize the envelope with a placeholder, then splice the raw base64
+    # bytes in so the largest field skips a second UTF-8 decode/encode pass
+    envelope = orjson.dumps({
         "contents": [{
             "parts": [
                 {"text": prompt},
-                {"inlineData": {"mimeType": "image/png", "data": request.sceneData}}
+                {"inlineData": {"mimeType": "image/png", "data": SCENE_DATA_PLACEHOLDER}}
             ]
         }],
-        "generationConfig": {
-            "responseMimeType": "application/json",
-            "responseSchema": {
-                "type": "OBJECT",
-                "properties": {
-                    "challenge": {"type": "STRING"},
-                    "solution": {"type": "STRING"}
-                },
-                "required": ["challenge", "solution"]
-            }
-        }
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as response:
-            if not response.ok:
+        "generationConfig": ANALYZE_GENCONFIG
+    })
+    head, _, tail = envelope.partition(SCENE_DATA_MARKER)
+    payload_bytes = head + b'"' + scene_data.encode("ascii") + b'"' + tail
+
+    async with _gemini_sem:
+        async with request.app.state.http.post(ANALYZE_URL, data=payload_bytes, headers=JSON_HEADERS) as response:
+            if response.status != 200:
                 raise HTTPException(status_code=500, detail="Failed to analyze scene")
 
-            result = await response.json()
+            result = orjson.loads(await response.read())
 
     if result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
         try:
             content = result['candidates'][0]['content']['parts'][0]['text']
-            parsed = json.loads(content)
-            return AnalyzeSceneResponse(challenge=parsed['challenge'], solution=parsed['solution'])
+            parsed = orjson.loads(content)
+            return ORJSONResponse({"challenge": parsed['challenge'], "solution": parsed['solution']})
         except:
             raise HTTPException(status_code=500, detail="Invalid response from AI")
     else:
         raise HTTPException(status_code=500, detail="No content generated")
 
-@app.post("/api/game/validate-challenge", response_model=ValidateChallengeResponse)
-async def validate_challenge(request: ValidateChallengeRequest, session: Dict = Depends(get_session)):
-    check_rate_limit(session, 'validate_challenge', 50)
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={GEMINI_API_KEY}"
+@app.post("/api/game/validate-challenge")
+async def validate_challenge(body: ValidateChallengeRequest, request: Request, session: Session = Depends(get_session)):
+    await check_rate_limit(session, 'validate_challenge', 50)
 
-    system_prompt = "Eres un evaluador de respuestas para un juego. Tu única función es determinar si la respuesta de un usuario es correcta. Debes responder ÚNICAMENTE con la palabra 'si' o 'no', en minúsculas y sin ningún otro texto o puntuación."
-    user_prompt = f"Pregunta: \"{request.challenge}\"\nRespuesta Correcta: \"{request.solution}\"\nRespuesta del Usuario: \"{request.playerResponse}\""
+    user_prompt = f"Pregunta: \"{body.challenge}\"\nRespuesta Correcta: \"{body.solution}\"\nRespuesta del Usuario: \"{body.playerResponse}\""
 
     payload = {
         "contents": [{"parts": [{"text": user_prompt}]}],
-        "systemInstruction": {"parts": [{"text": system_prompt}]}
+        "systemInstruction": VALIDATE_SYSTEM_INSTRUCTION
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(api_url, json=payload) as response:
-            if not response.ok:
+    async with _gemini_sem:
+        async with request.app.state.http.post(VALIDATE_URL, data=orjson.dumps(payload), headers=JSON_HEADERS) as response:
+            if response.status != 200:
                 raise HTTPException(status_code=500, detail="Failed to validate challenge")
 
-            result = await response.json()
+            result = orjson.loads(await response.read())
 
     if result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
         validation = result['candidates'][0]['content']['parts'][0]['text'].strip().lower()
-        return ValidateChallengeResponse(correct=validation == 'si')
+        return ORJSONResponse({"correct": validation == 'si'})
     else:
         raise HTTPException(status_code=500, detail="No validation result")
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Multiple workers only make sense with the shared Redis store; the
+    # in-memory store is per-process and would break the auth path
+    workers = int(os.getenv("WEB_CONCURRENCY", 1)) if REDIS_URL else 1
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="uvloop", http="httptools")